@@ -7,20 +7,30 @@ Based on the original CUTLASS build configuration
 
 import os
 import sys
-import subprocess
 import argparse
+import asyncio
+import functools
+import hashlib
 import multiprocessing
+import subprocess
+import tempfile
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 import time
-from typing import List, Tuple, Optional
+from typing import Iterator, List, NamedTuple, Sequence, Tuple, Optional
 
 # Configuration - use relative paths
 SCRIPT_DIR = Path(__file__).parent.absolute()
 BUILD_DIR = SCRIPT_DIR
 SOURCE_DIR = SCRIPT_DIR.parent
 INPUT_DIR = BUILD_DIR / "tools/library/generated/gemm"
+_INPUT_DIR_PREFIX = os.fspath(INPUT_DIR) + os.sep
 NVCC = "/usr/local/cuda/bin/nvcc"
+CU_SUFFIX = ".cu"
+STDERR_LIMIT = 4096  # Bytes of nvcc stderr kept for error reporting
+BATCH_SIZE = 16  # Number of .cu files compiled per nvcc invocation in parallel mode
+BATCH_TIMEOUT = 600  # Seconds before a batch is abandoned in favor of per-file compilation
+PROGRESS_INTERVAL = 2.0  # Minimum seconds between progress lines in parallel mode
 
 # Compilation flags from the original build
 CUDA_FLAGS = [
@@ -39,7 +49,8 @@ CUDA_FLAGS = [
     "-DCUTLASS_CONV_UNIT_TEST_RIGOROUS_SIZE_ENABLED=1",
     "-DCUTLASS_DEBUG_TRACE_LEVEL=0",
     "-Xcompiler=-Wconversion",
-    "-Xcompiler=-fno-strict-aliasing"
+    "-Xcompiler=-fno-strict-aliasing",
+    "--threads=0"  # Let nvcc parallelize independent compilation passes
 ]
 
 # Include paths from the original build
@@ -52,7 +63,199 @@ INCLUDE_PATHS = [
     "-isystem", "/usr/local/cuda/include"
 ]
 
-def generate_ptx_single(cu_file: str, sm_arch: str, output_dir: Path, job_id: int = 0, verbose: bool = True) -> Tuple[bool, str, str]:
+# Immutable pieces of the nvcc command line, built once instead of per file
+_NVCC_PREFIX = (NVCC, "-ptx")
+_INCLUDE_TAIL = tuple(INCLUDE_PATHS)
+
+@functools.lru_cache(maxsize=None)
+def _nvcc_tail(cuda_flags: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Get the flags and include paths that follow the input file(s) on the nvcc command line"""
+    return cuda_flags + _INCLUDE_TAIL
+
+@functools.lru_cache(maxsize=None)
+def _cache_key_options(cuda_flags: Tuple[str, ...]) -> bytes:
+    """Get the compiler options component of the compile cache key"""
+    # nvcc thread count does not affect the generated PTX, so keep it out of the key
+    options = (NVCC,) + tuple(flag for flag in cuda_flags if not flag.startswith("--threads=")) + _INCLUDE_TAIL
+    return b"\0".join(opt.encode() for opt in options)
+
+def _include_dirs() -> List[str]:
+    """Get the directories named by -I/-isystem in INCLUDE_PATHS"""
+    dirs = []
+    for i, path in enumerate(INCLUDE_PATHS):
+        if path.startswith("-I"):
+            dirs.append(path[2:])
+        elif path == "-isystem" and i + 1 < len(INCLUDE_PATHS):
+            dirs.append(INCLUDE_PATHS[i + 1])
+    return dirs
+
+def _walk_files(directory: str) -> Iterator[os.DirEntry]:
+    """Recursively yield the file entries under directory, skipping unreadable directories"""
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                yield from _walk_files(entry.path)
+            else:
+                yield entry
+
+@functools.lru_cache(maxsize=None)
+def _include_snapshot() -> bytes:
+    """
+    Hash (path, mtime, size) of every file under the include directories
+    
+    Computed once per run, so editing any header (e.g. a CUTLASS header under
+    include/) changes the options hash and invalidates every cached PTX.
+    """
+    snapshot = hashlib.blake2b()
+    for directory in _include_dirs():
+        for entry in sorted(_walk_files(directory), key=lambda e: e.path):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            snapshot.update(f"{entry.path}\0{st.st_mtime_ns}\0{st.st_size}\n".encode())
+    return snapshot.digest()
+
+@functools.lru_cache(maxsize=None)
+def _options_hash(cuda_flags: Tuple[str, ...]) -> str:
+    """Hash the compiler options and include snapshot component of the compile cache key"""
+    return hashlib.blake2b(_cache_key_options(cuda_flags) + b"\0" + _include_snapshot()).hexdigest()
+
+def compute_source_hash(cu_file: str) -> str:
+    """Hash the source contents component of the compile cache key"""
+    with open(cu_file, 'rb') as f:
+        return hashlib.blake2b(f.read()).hexdigest()
+
+def read_cache_key(key_file: Path) -> Optional[Tuple[str, str]]:
+    """Read a stored (options_hash, source_hash) cache key, returning None if missing or malformed"""
+    try:
+        fields = key_file.read_text().split()
+    except OSError:
+        return None
+    if len(fields) != 2:
+        return None
+    return fields[0], fields[1]
+
+def write_cache_key(key_file: Path, options_hash: str, source_hash: str) -> None:
+    """Atomically write a compile cache key next to its PTX output"""
+    tmp_file = key_file.with_name(f"{key_file.name}.{os.getpid()}.tmp")
+    tmp_file.write_text(f"{options_hash}\n{source_hash}\n")
+    os.replace(tmp_file, key_file)
+
+def is_newer(path: Path, cu_file: str) -> bool:
+    """Check whether path exists and is newer than cu_file (make-style up-to-date test)"""
+    try:
+        dst_mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return False
+    return dst_mtime > os.stat(cu_file).st_mtime
+
+def check_cache(cu_file: str, output_file: Path, key_file: Path, cuda_flags: Tuple[str, ...]) -> Tuple[bool, str]:
+    """
+    Check whether output_file is up to date for cu_file compiled with cuda_flags
+    
+    The stored options hash (flags, include paths and a snapshot of the
+    include directories) must always match. The mtime test only lets a key
+    newer than the source skip re-hashing the source; outputs without a key
+    (e.g. left by a failed or killed nvcc) are never trusted.
+    
+    Returns:
+        Tuple of (up_to_date, source_hash)
+    """
+    stored = read_cache_key(key_file)
+    if stored is not None and stored[0] == _options_hash(cuda_flags) and output_file.exists():
+        if is_newer(key_file, cu_file):
+            return True, stored[1]
+        source_hash = compute_source_hash(cu_file)
+        if stored[1] != source_hash:
+            return False, source_hash
+        # Source was only touched; refresh the key so later runs can skip hashing it again
+        os.utime(key_file)
+        return True, source_hash
+    return False, compute_source_hash(cu_file)
+
+def get_relative_path(cu_file: str) -> str:
+    """Get the path of a .cu file relative to INPUT_DIR (or its parent directory if outside INPUT_DIR)"""
+    cu_file = os.fspath(cu_file)
+    
+    # Plain prefix test avoids Path.relative_to and its ValueError in the common case
+    if cu_file.startswith(_INPUT_DIR_PREFIX):
+        return cu_file[len(_INPUT_DIR_PREFIX):]
+    
+    # File is not under INPUT_DIR, use relative to parent directory
+    cu_path = Path(cu_file)
+    if len(cu_path.parts) >= 2:
+        return "/".join(cu_path.parts[-2:])
+    return cu_path.name
+
+def get_output_file(output_dir: Path, relative_path: str) -> Path:
+    """Get the PTX output path for a .cu file (only the suffix changes, never directory names)"""
+    return output_dir / Path(relative_path).with_suffix('.ptx')
+
+def _read_stderr(stderr_file) -> str:
+    """Read back at most STDERR_LIMIT bytes of nvcc stderr from its temporary file"""
+    stderr_file.seek(0)
+    return stderr_file.read(STDERR_LIMIT).decode(errors='replace')
+
+def run_nvcc(cmd: Sequence[str], timeout: float) -> Tuple[int, str]:
+    """
+    Run an nvcc command, blocking until it finishes
+    
+    stderr is streamed to a temporary file rather than buffered in memory,
+    since template errors can produce megabytes of output per file.
+    
+    Returns:
+        Tuple of (returncode, stderr), where stderr holds at most the first
+        STDERR_LIMIT bytes and is only read on failure. Raises
+        subprocess.TimeoutExpired (after killing the process) if it does not
+        finish within timeout seconds.
+    """
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr_file)
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            raise
+        
+        if proc.returncode == 0:
+            return 0, ""
+        return proc.returncode, _read_stderr(stderr_file)
+
+async def run_nvcc_async(cmd: Sequence[str], timeout: float) -> Tuple[int, str]:
+    """
+    Run an nvcc command as an asyncio subprocess
+    
+    Same contract as run_nvcc, but raises asyncio.TimeoutError on timeout.
+    """
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=stderr_file
+        )
+        try:
+            await asyncio.wait_for(proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        
+        if proc.returncode == 0:
+            return 0, ""
+        return proc.returncode, _read_stderr(stderr_file)
+
+def generate_ptx_single(cu_file: str, sm_arch: str, output_dir: Path, job_id: int = 0, verbose: bool = True,
+                        cuda_flags: Optional[Tuple[str, ...]] = None, force: bool = False) -> Tuple[bool, str, str]:
     """
     Generate PTX file for a single .cu file
     
@@ -62,49 +265,49 @@ def generate_ptx_single(cu_file: str, sm_arch: str, output_dir: Path, job_id: in
         output_dir: Output directory for PTX files
         job_id: Job identifier for logging
         verbose: Whether to print progress messages
+        cuda_flags: Architecture-specific CUDA flags (computed from CUDA_FLAGS if None)
+        force: Recompile even if the PTX file is up to date
         
     Returns:
         Tuple of (success, relative_path, error_message)
     """
     relative_path = str(cu_file)  # Default fallback
     try:
-        cu_path = Path(cu_file)
+        relative_path = get_relative_path(cu_file)
         
-        # Try to get relative path, but handle case where cu_file is not under INPUT_DIR
-        try:
-            relative_path = str(cu_path.relative_to(INPUT_DIR))
-        except ValueError:
-            # File is not under INPUT_DIR, use relative to parent directory
-            if len(cu_path.parts) >= 2:
-                relative_path = "/".join(cu_path.parts[-2:])
-            else:
-                relative_path = cu_path.name
+        # Create output file path (its directory is created up-front by create_output_dirs)
+        output_file = get_output_file(output_dir, relative_path)
         
-        # Create output file path
-        output_file = output_dir / relative_path.replace('.cu', '.ptx')
-        output_file.parent.mkdir(parents=True, exist_ok=True)
+        if cuda_flags is None:
+            cuda_flags = get_cuda_flags_for_arch(sm_arch)
+        
+        # Skip compilation if the PTX was built from identical source and flags
+        key_file = output_file.with_name(output_file.name + '.key')
+        if force:
+            source_hash = compute_source_hash(cu_file)
+        else:
+            up_to_date, source_hash = check_cache(cu_file, output_file, key_file, cuda_flags)
+            if up_to_date:
+                if verbose:
+                    print(f"[{job_id:4d}] ✓ Up to date (sm_{sm_arch}): {output_file.name}")
+                return True, relative_path, ""
         
         if verbose:
             print(f"[{job_id:4d}] Processing (sm_{sm_arch}): {relative_path}")
         
         # Build nvcc command with architecture-specific flags
-        cuda_flags = get_cuda_flags_for_arch(sm_arch)
-        cmd = [NVCC, "-ptx", str(cu_file)] + cuda_flags + INCLUDE_PATHS + ["-o", str(output_file)]
+        cmd = (*_NVCC_PREFIX, str(cu_file), *_nvcc_tail(cuda_flags), "-o", str(output_file))
         
         # Run compilation
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout per file
-        )
+        returncode, stderr = run_nvcc(cmd, timeout=300)  # 5 minute timeout per file
         
-        if result.returncode == 0:
+        if returncode == 0:
+            write_cache_key(key_file, _options_hash(cuda_flags), source_hash)
             if verbose:
                 print(f"[{job_id:4d}] ✓ Success (sm_{sm_arch}): {output_file.name}")
             return True, relative_path, ""
         else:
-            error_msg = result.stderr.strip()
+            error_msg = stderr.strip()
             if verbose:
                 print(f"[{job_id:4d}] ✗ Failed (sm_{sm_arch}): {relative_path}")
                 if error_msg:
@@ -120,20 +323,165 @@ def generate_ptx_single(cu_file: str, sm_arch: str, output_dir: Path, job_id: in
             print(f"[{job_id:4d}] ✗ Exception: {relative_path} - {str(e)}")
         return False, relative_path, str(e)
 
+async def generate_ptx_batch_async(cu_files: List[str], sm_arch: str, output_dir: Path, job_id: int = 0, verbose: bool = True,
+                                   cuda_flags: Optional[Tuple[str, ...]] = None,
+                                   force: bool = False) -> List[Tuple[bool, str, str]]:
+    """
+    Generate PTX files for a batch of .cu files with a single nvcc invocation
+    
+    All files in the batch must map to the same output directory, since nvcc
+    writes the batch outputs with -odir. If the batch fails, or a file's PTX
+    output is missing afterwards, those files are recompiled individually so
+    errors are reported per file.
+    
+    Args:
+        cu_files: Paths to the .cu files
+        sm_arch: SM architecture (80, 90, 100)
+        output_dir: Output directory for PTX files
+        job_id: Job identifier for logging
+        verbose: Whether to print progress messages
+        cuda_flags: Architecture-specific CUDA flags (computed from CUDA_FLAGS if None)
+        force: Recompile even if the PTX files are up to date
+        
+    Returns:
+        List of (success, relative_path, error_message) tuples, one per file
+    """
+    if cuda_flags is None:
+        cuda_flags = get_cuda_flags_for_arch(sm_arch)
+    
+    # Hashing and stat calls block, so keep them off the event loop thread
+    loop = asyncio.get_running_loop()
+    results, pending = await loop.run_in_executor(None, _prepare_batch, cu_files, output_dir, cuda_flags, force)
+    
+    if not pending:
+        return results
+    
+    odir = pending[0].output_file.parent
+    
+    if verbose:
+        print(f"[{job_id:4d}] Processing batch of {len(pending)} files (sm_{sm_arch}): {odir}")
+    
+    cmd = (*_NVCC_PREFIX, "-odir", str(odir), *_nvcc_tail(cuda_flags), *(str(job.cu_file) for job in pending))
+    
+    try:
+        # Fixed cap so one hung file cannot hold a job slot for long before the fallback
+        returncode, _ = await run_nvcc_async(cmd, timeout=BATCH_TIMEOUT)
+        batch_ok = returncode == 0
+    except asyncio.TimeoutError:
+        batch_ok = False
+    
+    retry = pending
+    if batch_ok:
+        committed, retry = await loop.run_in_executor(None, _commit_batch, pending, cuda_flags)
+        results.extend(committed)
+        if verbose:
+            print(f"[{job_id:4d}] ✓ Batch success (sm_{sm_arch}): {len(committed)} files")
+        if not retry:
+            return results
+    
+    # Fall back to per-file compilation for granular error reporting
+    if verbose:
+        reason = "missing PTX output" if batch_ok else "batch failed"
+        print(f"[{job_id:4d}] ✗ {reason.capitalize()} (sm_{sm_arch}), retrying {len(retry)} files individually")
+    for job in retry:
+        results.append(await loop.run_in_executor(
+            None, generate_ptx_single, job.cu_file, sm_arch, output_dir, job_id, verbose, cuda_flags, force))
+    return results
+
+class PendingPtx(NamedTuple):
+    """A .cu file in a batch that still needs compiling"""
+    cu_file: str
+    relative_path: str
+    output_file: Path
+    key_file: Path
+    source_hash: str
+
+def _prepare_batch(cu_files: List[str], output_dir: Path, cuda_flags: Tuple[str, ...],
+                   force: bool) -> Tuple[List[Tuple[bool, str, str]], List[PendingPtx]]:
+    """Split a batch into results for up-to-date files and pending compile entries (blocking)"""
+    results = []
+    pending = []
+    for cu_file in cu_files:
+        try:
+            relative_path = get_relative_path(cu_file)
+            output_file = get_output_file(output_dir, relative_path)
+            key_file = output_file.with_name(output_file.name + '.key')
+            if force:
+                up_to_date, source_hash = False, compute_source_hash(cu_file)
+            else:
+                up_to_date, source_hash = check_cache(cu_file, output_file, key_file, cuda_flags)
+        except Exception as e:
+            results.append((False, str(cu_file), str(e)))
+            continue
+        
+        if up_to_date:
+            results.append((True, relative_path, ""))
+        else:
+            pending.append(PendingPtx(cu_file, relative_path, output_file, key_file, source_hash))
+    return results, pending
+
+def _commit_batch(pending: List[PendingPtx],
+                  cuda_flags: Tuple[str, ...]) -> Tuple[List[Tuple[bool, str, str]], List[PendingPtx]]:
+    """Write cache keys for batch outputs that exist; return results and entries to retry (blocking)"""
+    results = []
+    retry = []
+    for job in pending:
+        # Only trust files whose PTX output was actually written
+        if job.output_file.exists():
+            write_cache_key(job.key_file, _options_hash(cuda_flags), job.source_hash)
+            results.append((True, job.relative_path, ""))
+        else:
+            retry.append(job)
+    return results, retry
+
+def make_batches(cu_files: List[str], output_dir: Path, batch_size: int = BATCH_SIZE) -> List[List[str]]:
+    """Group .cu files by output subdirectory and split each group into batches of at most batch_size"""
+    groups = {}
+    for cu_file in cu_files:
+        out_subdir = get_output_file(output_dir, get_relative_path(cu_file)).parent
+        groups.setdefault(out_subdir, []).append(cu_file)
+    
+    batches = []
+    for group in groups.values():
+        for i in range(0, len(group), batch_size):
+            batches.append(group[i:i + batch_size])
+    return batches
+
+def create_output_dirs(cu_files: List[str], output_dir: Path) -> None:
+    """Create every output subdirectory needed for cu_files in one sweep"""
+    out_dirs = {get_output_file(output_dir, get_relative_path(cu_file)).parent for cu_file in cu_files}
+    for out_dir in out_dirs:
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+def _walk_cu_files(directory: str) -> Iterator[str]:
+    """Recursively yield .cu file paths using os.scandir's cached entry types"""
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        # Skip unreadable or vanished directories, as os.walk does
+        return
+    with entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                is_dir = False
+            if is_dir:
+                yield from _walk_cu_files(entry.path)
+            elif entry.name.endswith(CU_SUFFIX):
+                yield entry.path
+
 def find_cu_files(directory: str) -> List[str]:
     """Find all .cu files in the given directory"""
-    cu_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.cu'):
-                cu_files.append(os.path.join(root, file))
-    return sorted(cu_files)
-
-def process_directory_serial(directory: str, arch: str, output_dir: Path, verbose: bool = True) -> Tuple[int, int]:
-    """Process files in a directory serially"""
+    return sorted(_walk_cu_files(directory))
+
+def process_directory_serial(directory: str, arch: str, output_dir: Path, verbose: bool = True,
+                             cu_files: Optional[List[str]] = None, force: bool = False) -> Tuple[int, int]:
+    """Process files in a directory serially (cu_files skips re-scanning the directory if given)"""
     print(f"Processing SM{arch} kernels in {directory}...")
     
-    cu_files = find_cu_files(directory)
+    if cu_files is None:
+        cu_files = find_cu_files(directory)
     total_count = len(cu_files)
     
     if total_count == 0:
@@ -142,11 +490,17 @@ def process_directory_serial(directory: str, arch: str, output_dir: Path, verbos
         
     print(f"Found {total_count} .cu files to process")
     
+    create_output_dirs(cu_files, output_dir)
+    
+    # Compute flags (and the include snapshot in the cache key) once for the whole run rather than per file
+    cuda_flags = get_cuda_flags_for_arch(arch)
+    _options_hash(cuda_flags)
+    
     success_count = 0
     failed_files = []
     
     for i, cu_file in enumerate(cu_files, 1):
-        success, relative_path, error = generate_ptx_single(cu_file, arch, output_dir, i, verbose)
+        success, relative_path, error = generate_ptx_single(cu_file, arch, output_dir, i, verbose, cuda_flags, force)
         if success:
             success_count += 1
         else:
@@ -168,14 +522,16 @@ def process_directory_serial(directory: str, arch: str, output_dir: Path, verbos
     
     return success_count, failed_count
 
-def process_directory_parallel(directory: str, arch: str, output_dir: Path, max_workers: int = None, verbose: bool = True) -> Tuple[int, int]:
-    """Process files in a directory in parallel"""
+def process_directory_parallel(directory: str, arch: str, output_dir: Path, max_workers: int = None, verbose: bool = True,
+                               cu_files: Optional[List[str]] = None, force: bool = False) -> Tuple[int, int]:
+    """Process files in a directory in parallel (cu_files skips re-scanning the directory if given)"""
     if max_workers is None:
         max_workers = multiprocessing.cpu_count()
         
     print(f"Processing SM{arch} kernels in {directory} with {max_workers} parallel jobs...")
     
-    cu_files = find_cu_files(directory)
+    if cu_files is None:
+        cu_files = find_cu_files(directory)
     total_count = len(cu_files)
     
     if total_count == 0:
@@ -184,26 +540,69 @@ def process_directory_parallel(directory: str, arch: str, output_dir: Path, max_
         
     print(f"Found {total_count} .cu files to process")
     
+    create_output_dirs(cu_files, output_dir)
+    
+    start_time = time.monotonic()
+    
+    nvcc_threads = get_nvcc_threads(max_workers)
+    cuda_flags = get_cuda_flags_for_arch(arch, nvcc_threads)
+    # Snapshot include directories up-front so worker threads don't race to compute it
+    _options_hash(cuda_flags)
+    
+    # Batch files that share an output directory
+    batches = make_batches(cu_files, output_dir)
+    success_count, failed_files = asyncio.run(
+        _run_batches_async(batches, arch, output_dir, cuda_flags, max_workers, total_count, start_time, verbose, force)
+    )
+    
+    elapsed = time.monotonic() - start_time
+    failed_count = total_count - success_count
+    print(f"SM{arch} Summary: {success_count} successful, {failed_count} failed out of {total_count} files")
+    print(f"Total time: {elapsed/60:.1f} minutes ({total_count/elapsed:.1f} files/sec)")
+    
+    if failed_files and verbose:
+        print("Failed files:")
+        for rel_path, error in failed_files[:10]:  # Show first 10 failures
+            print(f"  {rel_path}: {error[:80]}...")
+        if len(failed_files) > 10:
+            print(f"  ... and {len(failed_files) - 10} more")
+    
+    return success_count, failed_count
+
+async def _run_batches_async(batches: List[List[str]], arch: str, output_dir: Path, cuda_flags: Tuple[str, ...],
+                             max_workers: int, total_count: int, start_time: float,
+                             verbose: bool, force: bool = False) -> Tuple[int, List[Tuple[str, str]]]:
+    """Compile batches from a single event loop with at most max_workers nvcc processes in flight"""
+    semaphore = asyncio.Semaphore(max_workers)
+    # Blocking file I/O and per-file fallbacks run here, sized to match the job limit
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max_workers))
+    
+    async def run_batch(batch: List[str], job_id: int):
+        async with semaphore:
+            try:
+                return batch, job_id, await generate_ptx_batch_async(batch, arch, output_dir, job_id, False, cuda_flags, force)
+            except Exception as e:
+                return batch, job_id, e
+    
     success_count = 0
     failed_files = []
     completed = 0
+    last_report_time = start_time
     
-    start_time = time.time()
+    # Submit all jobs
+    tasks = [asyncio.ensure_future(run_batch(batch, i)) for i, batch in enumerate(batches, 1)]
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all jobs
-        future_to_file = {
-            executor.submit(generate_ptx_single, cu_file, arch, output_dir, i, False): (cu_file, i) 
-            for i, cu_file in enumerate(cu_files, 1)
-        }
+    # Process completed jobs
+    for next_done in asyncio.as_completed(tasks):
+        batch, job_id, results = await next_done
+        completed += len(batch)
         
-        # Process completed jobs
-        for future in as_completed(future_to_file):
-            cu_file, job_id = future_to_file[future]
-            completed += 1
-            
-            try:
-                success, relative_path, error = future.result()
+        if isinstance(results, Exception):
+            failed_files.extend((str(cu_file), str(results)) for cu_file in batch)
+            if verbose:
+                print(f"[{job_id:4d}] ✗ Exception: {str(results)}")
+        else:
+            for success, relative_path, error in results:
                 if success:
                     success_count += 1
                     if verbose:
@@ -212,43 +611,40 @@ def process_directory_parallel(directory: str, arch: str, output_dir: Path, max_
                     failed_files.append((relative_path, error))
                     if verbose:
                         print(f"[{job_id:4d}] ✗ Failed: {relative_path}")
-                        
-            except Exception as e:
-                failed_files.append((str(cu_file), str(e)))
-                if verbose:
-                    print(f"[{job_id:4d}] ✗ Exception: {str(e)}")
-            
-            # Progress indicator
-            if completed % 100 == 0:
-                elapsed = time.time() - start_time
-                rate = completed / elapsed
-                eta = (total_count - completed) / rate if rate > 0 else 0
-                print(f"Progress: {completed}/{total_count} ({success_count} successful) "
-                      f"- {rate:.1f} files/sec - ETA: {eta/60:.1f}min")
-    
-    elapsed = time.time() - start_time
-    failed_count = total_count - success_count
-    print(f"SM{arch} Summary: {success_count} successful, {failed_count} failed out of {total_count} files")
-    print(f"Total time: {elapsed/60:.1f} minutes ({total_count/elapsed:.1f} files/sec)")
-    
-    if failed_files and verbose:
-        print("Failed files:")
-        for rel_path, error in failed_files[:10]:  # Show first 10 failures
-            print(f"  {rel_path}: {error[:80]}...")
-        if len(failed_files) > 10:
-            print(f"  ... and {len(failed_files) - 10} more")
+        
+        # Progress indicator, rate-limited to one line per PROGRESS_INTERVAL seconds
+        now = time.monotonic()
+        if now - last_report_time > PROGRESS_INTERVAL:
+            last_report_time = now
+            elapsed = now - start_time
+            rate = completed / elapsed
+            eta = (total_count - completed) / rate if rate > 0 else 0
+            print(f"Progress: {completed}/{total_count} ({success_count} successful) "
+                  f"- {rate:.1f} files/sec - ETA: {eta/60:.1f}min")
     
-    return success_count, failed_count
+    return success_count, failed_files
 
-def get_cuda_flags_for_arch(arch: str) -> List[str]:
-    """Get CUDA flags modified for specific architecture"""
+@functools.lru_cache(maxsize=None)
+def get_cuda_flags_for_arch(arch: str, nvcc_threads: Optional[int] = None) -> Tuple[str, ...]:
+    """Get CUDA flags modified for specific architecture (and optionally nvcc thread count)"""
     flags = CUDA_FLAGS.copy()
     # Replace compute_80,code=sm_80 with the target architecture
     for i, flag in enumerate(flags):
         if flag.startswith("--generate-code=arch=compute_80,code=sm_80"):
             flags[i] = f"--generate-code=arch=compute_{arch},code=sm_{arch}"
             break
-    return flags
+    if nvcc_threads is not None:
+        flags = [flag for flag in flags if not flag.startswith("--threads=")]
+        flags.append(f"--threads={nvcc_threads}")
+    return tuple(flags)
+
+def get_nvcc_threads(max_workers: int) -> int:
+    """Get per-invocation nvcc thread count so that outer jobs x nvcc threads does not oversubscribe"""
+    cpu_count = multiprocessing.cpu_count()
+    if max_workers >= cpu_count:
+        # Many single-threaded jobs beat a few multi-threaded ones
+        return 1
+    return max(1, cpu_count // max_workers)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -261,6 +657,7 @@ Examples:
   %(prog)s -j 8               # Parallel processing with 8 workers
   %(prog)s --arch 80          # Process only SM80 kernels
   %(prog)s --arch all         # Process all available architectures
+  %(prog)s --force            # Recompile even up-to-date PTX files
         """
     )
     
@@ -272,6 +669,9 @@ Examples:
                        help='Verbose output')
     parser.add_argument('--dry-run', action='store_true',
                        help='Show what would be processed without running compilation')
+    parser.add_argument('--force', action='store_true',
+                       help='Recompile all files even if their PTX output is up to date '
+                            '(header edits are detected by mtime/size; use this for other changes, e.g. nvcc upgrades)')
     
     args = parser.parse_args()
     
@@ -280,6 +680,8 @@ Examples:
         max_workers = multiprocessing.cpu_count()
         parallel = True
     elif isinstance(args.parallel, int):
+        if args.parallel < 1:
+            parser.error(f"-j/--parallel requires at least 1 worker (got {args.parallel})")
         max_workers = args.parallel
         parallel = True
     elif args.parallel is None:
@@ -323,6 +725,9 @@ Examples:
         '100': BUILD_DIR / 'PTX_sm100'
     }
     
+    # Scan the input directory once; every architecture compiles the same sources
+    cu_files = find_cu_files(str(INPUT_DIR))
+    
     total_success = 0
     total_failed = 0
     
@@ -339,15 +744,14 @@ Examples:
         print(f"Output directory: {output_dir}")
         
         if args.dry_run:
-            cu_files = find_cu_files(str(INPUT_DIR))
             print(f"Would process {len(cu_files)} .cu files for SM{arch}")
             continue
         
         try:
             if parallel:
-                success, failed = process_directory_parallel(str(INPUT_DIR), arch, output_dir, max_workers, args.verbose)
+                success, failed = process_directory_parallel(str(INPUT_DIR), arch, output_dir, max_workers, args.verbose, cu_files, args.force)
             else:
-                success, failed = process_directory_serial(str(INPUT_DIR), arch, output_dir, args.verbose)
+                success, failed = process_directory_serial(str(INPUT_DIR), arch, output_dir, args.verbose, cu_files, args.force)
                 
             total_success += success
             total_failed += failed
@@ -10,16 +10,37 @@ import sys
 import argparse
 import random
 from pathlib import Path
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List
+
+CU_SUFFIX = ".cu"
+
+def _walk_cu_files(directory: str) -> Iterator[str]:
+    """Recursively yield .cu file paths using os.scandir's cached entry types"""
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        # Skip unreadable or vanished directories, as os.walk does
+        return
+    with entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                is_dir = False
+            if is_dir:
+                yield from _walk_cu_files(entry.path)
+            elif entry.name.endswith(CU_SUFFIX):
+                yield entry.path
+
+def _is_empty(directory: Path) -> bool:
+    """Check whether a directory is empty by reading at most one entry"""
+    with os.scandir(directory) as entries:
+        return next(entries, None) is None
 
 def find_cu_files(directory: Path) -> List[Path]:
     """Find all .cu files in the given directory recursively"""
-    cu_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.cu'):
-                cu_files.append(Path(root) / file)
-    return cu_files
+    return [Path(path) for path in _walk_cu_files(os.fspath(directory))]
 
 def main():
     parser = argparse.ArgumentParser(
@@ -90,9 +111,8 @@ Examples:
     
     # Randomly sample files to keep
     print(f"Randomly sampling {args.limit} files from {total_files} total files...")
-    files_to_keep = random.sample(cu_files, args.limit)
-    files_to_keep_set = set(files_to_keep)
-    files_to_remove = [f for f in cu_files if f not in files_to_keep_set]
+    random.shuffle(cu_files)
+    files_to_keep, files_to_remove = cu_files[:args.limit], cu_files[args.limit:]
     
     print(f"Will keep {len(files_to_keep)} randomly selected files")
     print(f"Will remove {len(files_to_remove)} files")
@@ -133,22 +153,28 @@ Examples:
     removed_count = 0
     failed_removals = []
     
-    for file_path in files_to_remove:
-        try:
-            file_path.unlink()  # Remove the file
-            removed_count += 1
-            
-            if args.verbose:
-                rel_path = file_path.relative_to(target_dir)
-                print(f"  Removed: {rel_path}")
-            elif removed_count % 100 == 0:
-                print(f"  Progress: {removed_count}/{len(files_to_remove)} files removed")
+    # unlink releases the GIL, so a thread pool overlaps the per-file syscall latency
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_file = {executor.submit(file_path.unlink): file_path for file_path in files_to_remove}
+        
+        for future in as_completed(future_to_file):
+            file_path = future_to_file[future]
+            try:
+                future.result()  # Re-raise any error from removing the file
+                removed_count += 1
                 
-        except Exception as e:
-            failed_removals.append((file_path, str(e)))
-            if args.verbose:
-                rel_path = file_path.relative_to(target_dir)
-                print(f"  Failed to remove: {rel_path} - {e}")
+                if args.verbose:
+                    rel_path = file_path.relative_to(target_dir)
+                    print(f"  Removed: {rel_path}")
+                elif removed_count % 100 == 0:
+                    print(f"  Progress: {removed_count}/{len(files_to_remove)} files removed")
+                    
+            except Exception as e:
+                failed_removals.append((file_path, str(e)))
+                if args.verbose:
+                    rel_path = file_path.relative_to(target_dir)
+                    print(f"  Failed to remove: {rel_path} - {e}")
     
     # Clean up empty directories
     print("Cleaning up empty directories...")
@@ -160,7 +186,7 @@ Examples:
         if root_path != target_dir:  # Don't remove the target directory itself
             try:
                 # Check if directory is empty
-                if not any(root_path.iterdir()):
+                if _is_empty(root_path):
                     root_path.rmdir()
                     empty_dirs_removed += 1
                     if args.verbose: